@@ -71,6 +71,8 @@ dependencies = (
     vlm_dependencies.Dependency(module="PIL", package="Pillow", name="Pillow"),
     # Win32 native lib: https://github.com/mhammond/pywin32
     vlm_dependencies.Dependency(module="win32crypt", package="pywin32", name=None),
+    # Numba JIT compiler for the nesting hot loops: https://numba.pydata.org/
+    vlm_dependencies.Dependency(module="numba", package="numba", name=None),
 )
 dependencies_installed = vlm_dependencies.import_dependencies(dependencies)
 if dependencies_installed:
@@ -13,10 +13,10 @@
 #    You should have received a copy of the GNU General Public License
 #    along with this program.  If not, see <https://www.gnu.org/licenses/>
 
-from collections import defaultdict
 from pprint import pprint
 from math import fabs, sqrt
 import os
+import bisect
 import bpy
 import math
 import time
@@ -26,37 +26,80 @@ from mathutils import Vector
 import bmesh
 import gpu
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from gpu_extras.batch import batch_for_shader
 from . import vlm_utils
 from PIL import Image # External dependency
 
+try:
+    from numba import njit, prange, get_num_threads # External dependency, used to compile the nesting hot loops
+    has_numba = True
+except ImportError:
+    has_numba = False
+    def njit(*args, **kwargs):
+        # Numba is not available: decorated functions are run as plain Python
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda f: f
+    prange = range
+
 logger = vlm_utils.logger
 
 
 ## Code taken from Blender's core Magic UV add-on
 
-def parse_island(bm, face_idx, faces_left, island, face_to_verts, vert_to_faces):
-    faces_to_parse = [face_idx]
-    while faces_to_parse:
-        fidx = faces_to_parse.pop(0)
-        if fidx in faces_left:
-            faces_left.remove(fidx)
-            island.append(bm.faces[fidx])
-            for v in face_to_verts[fidx]:
-                connected_faces = vert_to_faces[v]
-                for cf in connected_faces:
-                    faces_to_parse.append(cf)
-
-
-def get_island(bm, face_to_verts, vert_to_faces, uv_layer):
+@njit(cache=True)
+def parse_islands(face_ptr, face_verts, vert_ptr, vert_faces):
+    '''Breadth first search of the islands (faces connected through their linked vertices).
+    Returns (island_faces, island_ptr) where island_faces[island_ptr[i]:island_ptr[i+1]] are the faces of island i
+    '''
+    n_faces = len(face_ptr) - 1
+    faces_left = np.ones(n_faces, np.bool_)
+    island_faces = np.empty(n_faces, np.int32)
+    island_ptr = [0]
+    n = 0
+    seed = 0
+    while n < n_faces:
+        while not faces_left[seed]:
+            seed += 1
+        faces_left[seed] = False
+        island_faces[n] = seed
+        i = n
+        n += 1
+        while i < n:
+            f = island_faces[i]
+            i += 1
+            for k in range(face_ptr[f], face_ptr[f + 1]):
+                v = face_verts[k]
+                for j in range(vert_ptr[v], vert_ptr[v + 1]):
+                    cf = vert_faces[j]
+                    if faces_left[cf]:
+                        faces_left[cf] = False
+                        island_faces[n] = cf
+                        n += 1
+        island_ptr.append(n)
+    return island_faces, np.array(island_ptr, np.int32)
+
+
+def get_island(faces, face_db):
     uv_island_lists = []
-    faces_left = set(face_to_verts.keys())
-    while faces_left:
-        current_island = []
-        face_idx = list(faces_left)[0]
-        parse_island(bm, face_idx, faces_left, current_island, face_to_verts, vert_to_faces)
+    face_ptr, face_verts, vert_ptr, vert_faces, loop_uvs = face_db
+    if has_numba:
+        island_faces, island_ptr = parse_islands(face_ptr, face_verts, vert_ptr, vert_faces)
+    else: # Plain Python is much faster on lists than on NumPy arrays read one element at a time
+        island_faces, island_ptr = parse_islands(face_ptr.tolist(), face_verts.tolist(), vert_ptr.tolist(), vert_faces.tolist())
+    # UV bounds of all islands at once, from the loop UVs gathered in island face order
+    face_sizes = np.diff(face_ptr)[island_faces]
+    loop_ptr = np.zeros(len(face_sizes) + 1, np.int32)
+    loop_ptr[1:] = np.cumsum(face_sizes)
+    island_loops = np.repeat(face_ptr[island_faces] - loop_ptr[:-1], face_sizes) + np.arange(loop_ptr[-1], dtype=np.int32)
+    island_uvs = loop_uvs[island_loops]
+    min_uvs = np.minimum.reduceat(island_uvs, loop_ptr[island_ptr[:-1]], axis=0).tolist()
+    max_uvs = np.maximum.reduceat(island_uvs, loop_ptr[island_ptr[:-1]], axis=0).tolist()
+    for start, end, min_uv, max_uv in zip(island_ptr[:-1].tolist(), island_ptr[1:].tolist(), min_uvs, max_uvs):
+        current_island = [faces[i] for i in island_faces[start:end].tolist()]
         island = {'faces': current_island, 'mat_index': current_island[0].material_index}
-        update_island_bounds(island, uv_layer)
+        set_island_bounds(island, Vector(min_uv), Vector(max_uv))
         uv_island_lists.append(island)
     return uv_island_lists
 
@@ -112,31 +155,56 @@ def get_merged_overlapping_islands(islands, uv_layer):
     
 
 def update_island_bounds(island, uv_layer):
-    max_uv = Vector((-10000000.0, -10000000.0))
-    min_uv = Vector((10000000.0, 10000000.0))
-    for face in island['faces']:
-        for l in face.loops:
-            uv = l[uv_layer].uv
-            max_uv.x = max(uv.x, max_uv.x)
-            max_uv.y = max(uv.y, max_uv.y)
-            min_uv.x = min(uv.x, min_uv.x)
-            min_uv.y = min(uv.y, min_uv.y)
+    uvs = np.array([l[uv_layer].uv[:] for face in island['faces'] for l in face.loops])
+    set_island_bounds(island, Vector(uvs.min(axis=0)), Vector(uvs.max(axis=0)))
+
+
+def set_island_bounds(island, min_uv, max_uv):
     island['max'] = max_uv
     island['min'] = min_uv
     island['size'] = max_uv - min_uv
     island['bb_area'] = (max_uv.x-min_uv.x)*(max_uv.y-min_uv.y)
 
 
-def create_vert_face_db(faces, uv_layer):
-    face_to_verts = defaultdict(set)
-    vert_to_faces = defaultdict(set)
-    for f in faces:
-        for l in f.loops:
-            u,v = l[uv_layer].uv.to_tuple(5)
-            id_ = (u, v, f.material_index), l.vert.index
-            face_to_verts[f.index].add(id_)
-            vert_to_faces[id_].add(f.index)
-    return (face_to_verts, vert_to_faces)
+def create_vert_face_db(mesh, uv_layer_name):
+    '''Build the adjacency between faces and linked vertices (mesh vertex with the same uv and material) as CSR arrays.
+    Mesh data is read in bulk, faces are identified by their polygon index. Returns (face_ptr, face_verts, vert_ptr, vert_faces, loop_uvs) where 
+    face_verts[face_ptr[f]:face_ptr[f+1]] are the linked vertices of face f and vert_faces[vert_ptr[v]:vert_ptr[v+1]] the faces using the linked vertex v,
+    loop_uvs[face_ptr[f]:face_ptr[f+1]] being the uv of the loops of face f
+    '''
+    n_faces = len(mesh.polygons)
+    n_loops = len(mesh.loops)
+    loop_start = np.empty(n_faces, np.int32)
+    loop_total = np.empty(n_faces, np.int32)
+    material_index = np.empty(n_faces, np.int32)
+    mesh.polygons.foreach_get('loop_start', loop_start)
+    mesh.polygons.foreach_get('loop_total', loop_total)
+    mesh.polygons.foreach_get('material_index', material_index)
+    loop_vert_index = np.empty(n_loops, np.int32)
+    mesh.loops.foreach_get('vertex_index', loop_vert_index)
+    loop_uv = np.empty(2 * n_loops, np.float32)
+    mesh.uv_layers[uv_layer_name].data.foreach_get('uv', loop_uv)
+    # Gather loop data in face order
+    face_ptr = np.zeros(n_faces + 1, np.int32)
+    face_ptr[1:] = np.cumsum(loop_total)
+    loop_face = np.repeat(np.arange(n_faces, dtype=np.int32), loop_total)
+    loops = np.repeat(loop_start - face_ptr[:-1], loop_total) + np.arange(face_ptr[-1], dtype=np.int32)
+    loop_uvs = loop_uv.reshape((-1, 2))[loops]
+    # Linked vertices are identified by integer keys (material, vertex, uv rounded to 5 digits). Loops are sorted by key
+    # with a stable sort, so the loops of each linked vertex are contiguous and kept in face order
+    quantized_uvs = np.rint(loop_uvs.astype(np.float64) * 1e5).astype(np.int64) # Rounded in double precision like Vector.to_tuple(5)
+    keys = (quantized_uvs[:, 1], quantized_uvs[:, 0], loop_vert_index[loops], material_index[loop_face])
+    order = np.lexsort(keys)
+    same_vert = np.ones(max(0, len(order) - 1), np.bool_)
+    for key in keys:
+        sorted_key = key[order]
+        same_vert &= sorted_key[1:] == sorted_key[:-1]
+    new_vert = np.ones(len(order), np.bool_) # First loop of each linked vertex
+    new_vert[1:] = ~same_vert
+    loop_vert = np.empty(len(order), np.int32)
+    loop_vert[order] = np.cumsum(new_vert) - 1
+    vert_ptr = np.append(np.flatnonzero(new_vert), len(order)).astype(np.int32)
+    return (face_ptr, loop_vert, vert_ptr, loop_face[order], loop_uvs)
 
 
 ## Code for 2D nesting algorithm
@@ -146,6 +214,17 @@ import collections
 NestBlock = namedtuple("NestBlock", "obj bm islands pix_count")
 NestMap = namedtuple("NestMap", "padding islands targets target_heights")
 
+def get_island_uvs(island, uv_layer):
+    '''Read the UV of all the loops of an island (in the order of island['loops']) as a (n_loops, 2) float32 array'''
+    return np.array([loop[uv_layer].uv[:] for loop in island['loops']], np.float32).reshape((-1, 2))
+
+
+def set_island_uvs(island, uv_layer, uvs):
+    '''Write back the UV of all the loops of an island from a (n_loops, 2) array'''
+    for loop, uv in zip(island['loops'], uvs.tolist()):
+        loop[uv_layer].uv = uv
+
+
 def nest(context, objects, uv_bake_name, uv_nest_name, tex_w, tex_h, nestmap_name, nestmap_offset):
     '''Perform nesting of a group of objects to a minimal (not optimal) set of nestmaps
     Eventually splitting objects that can't fit into a single nestmap.
@@ -160,13 +239,15 @@ def nest(context, objects, uv_bake_name, uv_nest_name, tex_w, tex_h, nestmap_nam
     tick_time = time.time()
     islands_to_pack = []
     render_sizes = {}
+    offscreens = {}
     
     to_prepare = [o for o in objects]
     while to_prepare:
         obj = to_prepare.pop()
         obj.vlmSettings.bake_nestmap = -1
-        r, v = prepare_nesting(context, obj, padding, uv_bake_name, render_sizes, tex_w, tex_h)
+        r, v = prepare_nesting(context, obj, padding, uv_bake_name, render_sizes, offscreens, tex_w, tex_h)
         if r == 'FAILED':
+            free_offscreens(offscreens)
             return None
         elif r == 'SPLITTED':
             to_prepare.extend(v)
@@ -177,10 +258,14 @@ def nest(context, objects, uv_bake_name, uv_nest_name, tex_w, tex_h, nestmap_nam
             logger.info(f'>> WARNING: Object {obj.name} is empty. It doesn\'t have any faces to nest.\n')
     prepare_length = time.time() - tick_time
 
+    # Blocks to pack are kept sorted by decreasing pixel count (blocks are removed from the list or inserted at their sorted position)
+    islands_to_pack.sort(key=lambda p: p.pix_count, reverse=True)
+
     # Nest groups of islands into nestmaps
     nestmap_index = 0
     n_failed = 0
     render_length = 0
+    image_cache = [] # Loaded renders, shared by all nestmaps since splitted objects are rendered to multiple nestmaps
     while islands_to_pack:
         # Select island groups
         pixcount = 0
@@ -215,7 +300,6 @@ def nest(context, objects, uv_bake_name, uv_nest_name, tex_w, tex_h, nestmap_nam
                 # pixcount += lm_pixcount
 
         # Dispatch large blocks on the total amount of remaining pages (don't put all the big one in the first page)
-        islands_to_pack.sort(key=lambda p: p.pix_count, reverse=True)
         for block in islands_to_pack[::n_min_pages]:
             if pixcount == 0 or (pixcount + block.pix_count <= pack_threshold and not block in selection):
                 selection.append(block)
@@ -231,40 +315,30 @@ def nest(context, objects, uv_bake_name, uv_nest_name, tex_w, tex_h, nestmap_nam
         while True:
             pixcount = 0
             selected_islands = []
+            selected_uv_layers = [] # Nesting uv layer of each selected island
             for block in selection:
                 pixcount += block.pix_count
                 selected_islands.extend(block.islands)
+                selected_uv_layers.extend([block.bm.loops.layers.uv[uv_nest_name]] * len(block.islands))
             selection_names = [block.obj.name for block in selection]
             logger.info(f'\nTrying to nest in a single texture the {len(selected_islands)} islands ({pixcount/float(tex_w*tex_h):6.2%} fill with {pixcount} px / {tex_w*tex_h} content)\n. Source objects: {selection_names}')
 
             # Save UV for undoing nesting if needed
-            uv_undo = []
-            for island in selected_islands:
-                obj, bm = island['source']
-                uv_layer = bm.loops.layers.uv[uv_nest_name]
-                for face in island['faces']:
-                    for loop in face.loops:
-                        uv_undo.append(Vector(loop[uv_layer].uv))
+            uv_undo = [get_island_uvs(island, uv_layer) for island, uv_layer in zip(selected_islands, selected_uv_layers)]
 
             nestmap = perform_nesting(selected_islands, uv_nest_name, tex_w, tex_h, padding, only_one_page=(len(selection) > 1))
             if len(nestmap.targets) == 1:
                 logger.info(f'. Nesting succeeded.')
                 # Success: store result for later nestmap render
                 tick_time = time.time()
-                render_nestmap(context, selection, uv_bake_name, nestmap, nestmap_name, nestmap_offset + nestmap_index)
+                render_nestmap(context, selection, uv_bake_name, nestmap, nestmap_name, nestmap_offset + nestmap_index, offscreens, image_cache)
                 render_length = time.time() - tick_time
                 nestmap_index = nestmap_index + 1
                 for block in selection:
                     islands_to_pack.remove(block)
                     obj, bm, block_islands, block_pix_count = block
-                    for face in bm.faces:
-                        face.tag = True
-                    for island in block_islands:
-                        for face in island['faces']:
-                            face.tag = False
-                    faces_to_remove = []
-                    for face in bm.faces:
-                        if face.tag: faces_to_remove.append(face)
+                    nested_faces = {face for island in block_islands for face in island['faces']}
+                    faces_to_remove = [face for face in bm.faces if face not in nested_faces]
                     if faces_to_remove: bmesh.ops.delete(bm, geom=faces_to_remove, context='FACES')
                     bm.to_mesh(obj.data)
                     bm.free()
@@ -334,14 +408,8 @@ def nest(context, objects, uv_bake_name, uv_nest_name, tex_w, tex_h, nestmap_nam
                         logger.info(f'. Nesting overflowed. Replacing {overflow_block.obj.name} ({overflow_block.pix_count}px) from nesting group (smallest incompatible nest block) with {n_added} smaller blocks ({added_pixcount}px)')
                     
                     # reset uv
-                    index = 0
-                    for island in selected_islands:
-                        obj, bm = island['source']
-                        uv_layer = bm.loops.layers.uv[uv_nest_name]
-                        for face in island['faces']:
-                            for loop in face.loops:
-                                loop[uv_layer].uv = uv_undo[index]
-                                index = index + 1
+                    for island, uv_layer, uvs in zip(selected_islands, selected_uv_layers, uv_undo):
+                        set_island_uvs(island, uv_layer, uvs)
                 else:
                     # This single block did not fit inside a single page. We have performed a full nest, so we can keep the first page, and split the other islands
                     # to be nested with other blocks
@@ -370,50 +438,39 @@ def nest(context, objects, uv_bake_name, uv_nest_name, tex_w, tex_h, nestmap_nam
                                 remaining_faces.append(face.index)
 
                     # Reset uv before duplicating
-                    index = 0
                     uv_redo = []
-                    for island in selected_islands:
-                        obj, bm = island['source']
-                        uv_layer = bm.loops.layers.uv[uv_nest_name]
-                        for face in island['faces']:
-                            for loop in face.loops:
-                                uv_redo.append(Vector(loop[uv_layer].uv))
-                                loop[uv_layer].uv = uv_undo[index]
-                                index = index + 1
+                    for island, uv_layer, uvs in zip(selected_islands, selected_uv_layers, uv_undo):
+                        uv_redo.append(get_island_uvs(island, uv_layer))
+                        set_island_uvs(island, uv_layer, uvs)
 
                     # duplicate the packed object mesh
                     dup = obj.copy()
                     dup.data = obj.data.copy()
                     bm2 = bm.copy()
-                    bm2.faces.ensure_lookup_table()
+                    bm2_faces = [f for f in bm2.faces]
                     splitted_objects.append(dup)
                     
                     # Restore uv of the nested faces
-                    index = 0
-                    for island in selected_islands:
-                        obj, bm = island['source']
-                        uv_layer = bm.loops.layers.uv[uv_nest_name]
-                        for face in island['faces']:
-                            for loop in face.loops:
-                                loop[uv_layer].uv = uv_redo[index]
-                                index = index + 1
+                    for island, uv_layer, uvs in zip(selected_islands, selected_uv_layers, uv_redo):
+                        set_island_uvs(island, uv_layer, uvs)
 
                     # Adjust data of remaining islands
                     for island in remaining_islands:
                         island['source'] = (dup, bm2)
-                        island['faces'] = [bm2.faces[face.index] for face in island['faces']]
+                        island['faces'] = [bm2_faces[face.index] for face in island['faces']]
+                        island['loops'] = [loop for face in island['faces'] for loop in face.loops]
 
                     # Create new object to be nested
-                    bmesh.ops.delete(bm2, geom=[bm2.faces[i] for i in nested_faces], context='FACES')
+                    bmesh.ops.delete(bm2, geom=[bm2_faces[i] for i in nested_faces], context='FACES')
                     bm2.to_mesh(dup.data)
                     [col.objects.link(dup) for col in obj.users_collection]
                     dup.vlmSettings.bake_nestmap = -1
 
                     # Prepare nesting of the remaining islands
-                    r, v = prepare_nesting(context, dup, padding, uv_bake_name, render_sizes, tex_w, tex_h)
+                    r, v = prepare_nesting(context, dup, padding, uv_bake_name, render_sizes, offscreens, tex_w, tex_h)
                     if r == 'SUCCESS':
                         logger.info(f'. {len(remaining_islands)} islands were splitted, and still need to be nested.')
-                        islands_to_pack.append(v)
+                        bisect.insort(islands_to_pack, v, key=lambda p: -p.pix_count)
                     elif r == 'EMPTY':
                         logger.info(f'>> WARNING: Object {dup.name} is empty. It doesn\'t have any faces to nest.\n')
                     else:
@@ -426,7 +483,7 @@ def nest(context, objects, uv_bake_name, uv_nest_name, tex_w, tex_h, nestmap_nam
                     # Render the resulting nestmap
                     nestmap = NestMap(padding, processed_islands, targets[0:1], target_heights[0:1])
                     tick_time = time.time()
-                    render_nestmap(context, [NestBlock(obj, None, processed_islands, processed_pix_count)], uv_bake_name, nestmap, nestmap_name, nestmap_offset + nestmap_index)
+                    render_nestmap(context, [NestBlock(obj, None, processed_islands, processed_pix_count)], uv_bake_name, nestmap, nestmap_name, nestmap_offset + nestmap_index, offscreens, image_cache)
                     render_length = time.time() - tick_time
                     nestmap_index = nestmap_index + 1
                     logger.info(f'. {len(processed_islands)} islands were nested on the first page and kept.')
@@ -435,6 +492,8 @@ def nest(context, objects, uv_bake_name, uv_nest_name, tex_w, tex_h, nestmap_nam
     # Free unprocessed data if any
     for block in islands_to_pack:
         block.bm.free()
+    cache_clear(image_cache)
+    free_offscreens(offscreens)
     total_length = time.time() - start_time
     logger.info(f'. Nestmapping finished ({n_failed} overflow were handled for {nestmap_index} generated nestmaps) in {str(datetime.timedelta(seconds=total_length))} (prepare={str(datetime.timedelta(seconds=prepare_length))}, nest={str(datetime.timedelta(seconds=total_length-prepare_length-render_length))}, render={str(datetime.timedelta(seconds=render_length))}).')
         
@@ -465,10 +524,28 @@ def cache_clear(cache):
     cache.clear()
 
 
-def render_nestmap(context, selection, uv_bake_name, nestmap, nestmap_name, nestmap_index):
+def get_offscreen(offscreens, key, width, height, format='RGBA8'):
+    '''Get an offscreen from a cache of offscreens, (re)creating it if it does not exist or is smaller than the requested size'''
+    offscreen = offscreens.get(key)
+    if offscreen is None or offscreen.width < width or offscreen.height < height:
+        if offscreen is not None:
+            width = max(width, offscreen.width)
+            height = max(height, offscreen.height)
+            offscreen.free()
+        offscreen = gpu.types.GPUOffScreen(width, height, format=format)
+        offscreens[key] = offscreen
+    return offscreen
+
+
+def free_offscreens(offscreens):
+    for offscreen in offscreens.values():
+        offscreen.free()
+    offscreens.clear()
+
+
+def render_nestmap(context, selection, uv_bake_name, nestmap, nestmap_name, nestmap_index, offscreens, image_cache):
     padding, islands, targets, target_heights = nestmap
     n_render_groups = vlm_utils.get_n_render_groups(context)
-    nestmaps = [np.zeros((len(target) * height * 4), 'f') for target, height in zip(targets, target_heights)]
     mask_path = vlm_utils.get_bakepath(context, type='MASKS')
 
     # Offscreen surface where the nestmaps are rendered
@@ -476,12 +553,12 @@ def render_nestmap(context, selection, uv_bake_name, nestmap, nestmap_name, nest
     offscreen_normalmaps = []
     has_alpha = []
     for target, height in zip(targets, target_heights):
-        offscreen_render = gpu.types.GPUOffScreen(len(target), height, format='RGBA16F')
+        offscreen_render = gpu.types.GPUOffScreen(target['width'], height, format='RGBA16F')
         with offscreen_render.bind():
             fb = gpu.state.active_framebuffer_get()
             fb.clear(color=(0.0, 0.0, 0.0, 0.0))
         offscreen_renders.append(offscreen_render)
-        offscreen_render = gpu.types.GPUOffScreen(len(target), height, format='RGBA16F')
+        offscreen_render = gpu.types.GPUOffScreen(target['width'], height, format='RGBA16F')
         with offscreen_render.bind():
             fb = gpu.state.active_framebuffer_get()
             fb.clear(color=(0.0, 0.0, 0.0, 0.0))
@@ -572,17 +649,29 @@ def render_nestmap(context, selection, uv_bake_name, nestmap, nestmap_name, nest
     render_shader = gpu.types.GPUShader(render_vs, render_fs)
     render_batch = batch_for_shader(render_shader, 'TRIS', { "pos": ((0, 0), (1, 0), (1, 1), (0, 0), (1, 1), (0, 1)) }, )
         
-    # Offscreen surface where we render the seam fading mask for lightmaps
-    offscreen_seams = None
+    # Offscreen surface where we render the seam fading mask for lightmaps (one per render size, kept in the offscreen cache)
+    # The seams are dilated by drawing them at all pixel offsets of the padding area (one instance per offset).
+    # Offsets are ordered by decreasing distance, nearer ones overwriting farther ones through the depth test.
     seams_vs = '''
         in vec2 pos; 
         in vec4 col; 
-        uniform vec2 ofs; 
+        uniform vec2 src_size;
+        uniform int padding;
+        uniform int instance_ofs;
         out vec4 colInterp; 
+        int dilation_ofs(int t)
+        { // -padding, padding, ..., -1, 1, 0
+            int d = padding - t / 2;
+            return t % 2 == 0 ? -d : d;
+        }
         void main() 
         {        
+            int i = instance_ofs + gl_InstanceID;
+            int k = 2 * padding + 1;
+            vec2 ofs = vec2(dilation_ofs(i / k), dilation_ofs(i % k)) / src_size;
+            float depth = 1.0 - float(i + 1) / float(k * k);
             colInterp = col; 
-            gl_Position = vec4(2.0 * (pos + ofs) - vec2(1.0), 0.0, 1.0); 
+            gl_Position = vec4(2.0 * (pos + ofs) - vec2(1.0), 2.0 * depth - 1.0, 1.0); 
         }'''
     seams_fs = '''
         in vec4 colInterp; 
@@ -597,7 +686,6 @@ def render_nestmap(context, selection, uv_bake_name, nestmap, nestmap_name, nest
     full_white_mask.pixels = (1.0, 1.0, 1.0, 1.0)
 
     # Load the render masks
-    image_cache = []
     with_normalmap = False
     for obj_name in sorted(list({obj.name for (obj, _, _, _) in selection}), key=lambda x:bpy.data.objects[x].vlmSettings.bake_lighting):
         obj = bpy.data.objects[obj_name]
@@ -613,8 +701,7 @@ def render_nestmap(context, selection, uv_bake_name, nestmap, nestmap_name, nest
             n, x, y, rot = island['place']
             src_w = island['src_w']
             src_h = island['src_h']
-            mask = island['masks'][rot]
-            mask_w = len(mask)
+            mask_w = island['mask_size'][1 if rot == 0 or rot == 2 else 0]
             min_x, min_y = island['min_i']
             if n > 0: # Skip islands that were nested to secondary pages: they have been splitted to other objects
                 continue
@@ -638,62 +725,49 @@ def render_nestmap(context, selection, uv_bake_name, nestmap, nestmap_name, nest
             else:
                 island_render_mask = full_white_mask
             
-            target_w = len(targets[n])
+            target_w = targets[n]['width']
             target_h = target_heights[n]
 
             # Compute render mask, including lightmap's seam fading
             if not island_obj.vlmSettings.is_lightmap: has_alpha[n] = True # This could be improved to detect non opaque bakemap
-            pts=[]
-            pts_col=[]
-            lines=[]
-            lines_col=[]
             color_layer = bm.loops.layers.color.verify()
             uv_layer = bm.loops.layers.uv[uv_bake_name]
-            for face in island['faces']:
-                prev_uv = first_uv = prev_col = first_col = None
-                for loop in face.loops:
-                    uv = loop[uv_layer].uv
-                    col = loop[color_layer]
-                    pts.append(uv)
-                    pts_col.append(col)
-                    if prev_uv:
-                        lines.append(prev_uv)
-                        lines_col.append(prev_col)
-                        lines.append(uv)
-                        lines_col.append(col)
-                    else:
-                        first_uv = uv
-                        first_col = col
-                    prev_uv = uv
-                    prev_col = col
-                lines.append(prev_uv)
-                lines_col.append(prev_col)
-                lines.append(first_uv)
-                lines_col.append(first_col)
+            pts = get_island_uvs(island, uv_layer)
+            pts_col = np.array([loop[color_layer][:] for loop in island['loops']], np.float32).reshape((-1, 4))
+            # Face edges as lines between each loop and the next one of its face (wrapping to the first one)
+            face_sizes = np.fromiter((len(face.loops) for face in island['faces']), np.int32, len(island['faces']))
+            face_starts = np.repeat(np.cumsum(face_sizes) - face_sizes, face_sizes)
+            loop_index = np.arange(len(pts))
+            line_index = np.stack((loop_index, face_starts + (loop_index - face_starts + 1) % np.repeat(face_sizes, face_sizes)), axis=1).reshape(-1)
+            lines = pts[line_index]
+            lines_col = pts_col[line_index]
             gpu.state.blend_set('NONE')
-            if offscreen_seams is None or offscreen_seams.width != src_w or offscreen_seams.height != src_h:
-                if offscreen_seams is not None: offscreen_seams.free()
-                offscreen_seams = gpu.types.GPUOffScreen(src_w, src_h, format='RGBA8')
+            gpu.state.depth_test_set('LESS_EQUAL')
+            gpu.state.depth_mask_set(True)
+            offscreen_seams = get_offscreen(offscreens, ('seams', src_w, src_h), src_w, src_h)
             with offscreen_seams.bind():
                 fb = gpu.state.active_framebuffer_get()
-                fb.clear(color=(0.0, 0.0, 0.0, 0.0))
+                fb.clear(color=(0.0, 0.0, 0.0, 0.0), depth=1.0)
                 tri_batch = batch_for_shader(seams_shader, 'TRIS', {"pos": pts, "col": pts_col})
                 pt_batch = batch_for_shader(seams_shader, 'POINTS', {"pos": pts, "col": pts_col})
                 line_batch = batch_for_shader(seams_shader, 'LINES', {"pos": lines, "col": lines_col})
                 seams_shader.bind()
-                for px in sorted(range(-padding, padding+1), key=lambda x:abs(x), reverse=True):
-                    for py in sorted(range(-padding, padding+1), key=lambda x:abs(x), reverse=True):
-                        seams_shader.uniform_float("ofs", (px/float(src_w), py/float(src_h)) )
+                seams_shader.uniform_float("src_size", (src_w, src_h))
+                seams_shader.uniform_int("padding", padding)
+                n_ofs = (2 * padding + 1) * (2 * padding + 1)
+                if hasattr(tri_batch, 'draw_instanced'): # Blender 3.5+
+                    seams_shader.uniform_int("instance_ofs", 0)
+                    tri_batch.draw_instanced(seams_shader, instance_count=n_ofs)
+                    pt_batch.draw_instanced(seams_shader, instance_count=n_ofs)
+                    line_batch.draw_instanced(seams_shader, instance_count=n_ofs)
+                else:
+                    for i in range(n_ofs):
+                        seams_shader.uniform_int("instance_ofs", i)
                         tri_batch.draw(seams_shader)
                         pt_batch.draw(seams_shader)
                         line_batch.draw(seams_shader)
-                # image_data = fb.read_color(0, 0, src_w, src_h, 4, 0, 'UBYTE')
-                # image_data.dimensions = src_w * src_h * 4
-                # if 'Debug' not in bpy.data.images:
-                    # bpy.data.images.new('Debug', src_w, src_h, alpha=True, float_buffer=False)
-                # pack_image = bpy.data.images['Debug']
-                # pack_image.scale(src_w, src_h)
-                # pack_image.pixels = [v / 255 for v in image_data]
+            gpu.state.depth_test_set('NONE')
+            gpu.state.depth_mask_set(False)
 
             # Copy the render, applying offset, rotation, flipping, masking, border/padding fading, and lightmap seam fading
             gpu.state.blend_set('ALPHA')
@@ -715,14 +789,6 @@ def render_nestmap(context, selection, uv_bake_name, nestmap, nestmap_name, nest
                     render_shader.uniform_sampler("seam_mask", offscreen_seams.texture_color)
                     render_shader.uniform_sampler("render", gpu.texture.from_image(island_render))
                     render_batch.draw(render_shader)
-                    # fb = gpu.state.active_framebuffer_get()
-                    # image_data = fb.read_color(0, 0, target_w, target_h, 4, 0, 'UBYTE')
-                    # image_data.dimensions = target_w * target_h * 4
-                    # if 'Debug-Out' not in bpy.data.images:
-                        # bpy.data.images.new('Debug-Out', target_w, target_h, alpha=True, float_buffer=True)
-                    # pack_image = bpy.data.images['Debug-Out']
-                    # pack_image.scale(target_w, target_h)
-                    # pack_image.pixels = [v / 255 for v in image_data]
             if island_normalmap is not None:
                 with_normalmap = True
                 with offscreen_normalmaps[n].bind():
@@ -742,272 +808,237 @@ def render_nestmap(context, selection, uv_bake_name, nestmap, nestmap_name, nest
 
     logger.info(f'. Saving nestmap')
 
-    # Cleanup loaded images
-    cache_clear(image_cache)
     bpy.data.images.remove(full_white_mask)
 
     # Save the rendered nestmaps
     scene = bpy.data.scenes.new('VLM.Tmp Scene')
     scene.view_settings.view_transform = 'Raw'
     scene.view_settings.look = 'None'
-    base_filepath = f'{vlm_utils.get_bakepath(context, type="EXPORT")}{nestmap_name} {nestmap_index}'
-    for i, target in enumerate(targets):
-        target_w = len(target)
-        target_h = target_heights[i]
-
-        image_data = offscreen_renders[i].texture_color.read()
-        image_data.dimensions = target_w * target_h * 4
-        pack_image = bpy.data.images.new(f'Nest {i}', target_w, target_h, alpha=has_alpha[i], float_buffer=True)
-        pack_image.pixels = [v for v in image_data]
-        
-        if len(targets) > 1:
-            path_exr = bpy.path.abspath(f'{base_filepath} {i}.exr')
-            path_png = bpy.path.abspath(f'{base_filepath} {i}.png')
-            path_webp = bpy.path.abspath(f'{base_filepath} {i}.webp')
-        else:
-            path_exr = bpy.path.abspath(f'{base_filepath}.exr')
-            path_png = bpy.path.abspath(f'{base_filepath}.png')
-            path_webp = bpy.path.abspath(f'{base_filepath}.webp')
-        scene.render.image_settings.color_mode = 'RGBA' if has_alpha[i] else 'RGB'
-        scene.render.image_settings.file_format = 'OPEN_EXR'
-        scene.render.image_settings.exr_codec = 'DWAA'
-        scene.render.image_settings.color_depth = '16'
-        pack_image.save_render(path_exr, scene=scene)
-        # Saving through save_render would save a linear PNG, not an sRGB one which is required by VPX
-        pack_image.filepath_raw = path_png
-        pack_image.file_format = 'PNG'
-        pack_image.save()
-        bpy.data.images.remove(pack_image)
-        Image.open(path_png).save(path_webp, format = "WebP", lossless = True)
-
-        filled = 0
-        for x in range(target_w):
-            for span in target[x]:
-                if span[0] < target_h:
-                    filled += min(target_h - 1, span[1]) - span[0] + 1
-        logger.info(f'. Texture #{i} has a size of {target_w}x{target_h} for a fill rate of {1.0 - (filled/(target_w*target_h)):>6.2%} (alpha: {has_alpha[i]})')
-    
-    # Save the normalmap nestmaps
-    if with_normalmap:
-        base_filepath = f'{vlm_utils.get_bakepath(context, type="EXPORT")}{nestmap_name} {nestmap_index} - NM'
+    scene.render.image_settings.file_format = 'OPEN_EXR'
+    scene.render.image_settings.exr_codec = 'DWAA'
+    scene.render.image_settings.color_depth = '16'
+    # PNG to WebP conversions are done by worker threads while the next textures are saved
+    with ThreadPoolExecutor(max_workers=4) as webp_executor:
+        webp_jobs = []
+        base_filepath = f'{vlm_utils.get_bakepath(context, type="EXPORT")}{nestmap_name} {nestmap_index}'
+        abs_base_filepath = bpy.path.abspath(base_filepath)
         for i, target in enumerate(targets):
-            target_w = len(target)
+            target_w = target['width']
             target_h = target_heights[i]
 
-            image_data = offscreen_normalmaps[i].texture_color.read()
+            image_data = offscreen_renders[i].texture_color.read()
             image_data.dimensions = target_w * target_h * 4
             pack_image = bpy.data.images.new(f'Nest {i}', target_w, target_h, alpha=has_alpha[i], float_buffer=True)
-            pack_image.pixels = [v for v in image_data]
+            pack_image.pixels.foreach_set(np.asarray(image_data, dtype=np.float32))
             
-            if len(targets) > 1:
-                path_exr = bpy.path.abspath(f'{base_filepath} {i}.exr')
-                path_png = bpy.path.abspath(f'{base_filepath} {i}.png')
-                path_webp = bpy.path.abspath(f'{base_filepath} {i}.webp')
-            else:
-                path_exr = bpy.path.abspath(f'{base_filepath}.exr')
-                path_png = bpy.path.abspath(f'{base_filepath}.png')
-                path_webp = bpy.path.abspath(f'{base_filepath}.webp')
-            scene.render.image_settings.color_mode = 'RGB'
-            scene.render.image_settings.file_format = 'OPEN_EXR'
-            scene.render.image_settings.exr_codec = 'DWAA'
-            scene.render.image_settings.color_depth = '16'
+            base_path = f'{abs_base_filepath} {i}' if len(targets) > 1 else abs_base_filepath
+            path_exr = f'{base_path}.exr'
+            path_png = f'{base_path}.png'
+            path_webp = f'{base_path}.webp'
+            scene.render.image_settings.color_mode = 'RGBA' if has_alpha[i] else 'RGB'
             pack_image.save_render(path_exr, scene=scene)
             # Saving through save_render would save a linear PNG, not an sRGB one which is required by VPX
             pack_image.filepath_raw = path_png
             pack_image.file_format = 'PNG'
             pack_image.save()
             bpy.data.images.remove(pack_image)
-            Image.open(path_png).save(path_webp, format = "WebP", lossless = True)
-    
-    bpy.data.scenes.remove(scene)
+            webp_jobs.append(webp_executor.submit(save_webp, path_png, path_webp))
+
+            # Free pixels inside the cropped texture (free spans starting below its top, clamped to it)
+            span_y0, span_y1 = target['y0'][:target_w], target['y1'][:target_w]
+            spans = (np.arange(span_y0.shape[1]) < target['n'][:target_w, None]) & (span_y0 < target_h)
+            filled = int(np.sum((np.minimum(target_h - 1, span_y1) - span_y0 + 1)[spans]))
+            logger.info(f'. Texture #{i} has a size of {target_w}x{target_h} for a fill rate of {1.0 - (filled/(target_w*target_h)):>6.2%} (alpha: {has_alpha[i]})')
+        
+        # Save the normalmap nestmaps
+        if with_normalmap:
+            base_filepath = f'{vlm_utils.get_bakepath(context, type="EXPORT")}{nestmap_name} {nestmap_index} - NM'
+            abs_base_filepath = bpy.path.abspath(base_filepath)
+            scene.render.image_settings.color_mode = 'RGB'
+            for i, target in enumerate(targets):
+                target_w = target['width']
+                target_h = target_heights[i]
+
+                image_data = offscreen_normalmaps[i].texture_color.read()
+                image_data.dimensions = target_w * target_h * 4
+                pack_image = bpy.data.images.new(f'Nest {i}', target_w, target_h, alpha=has_alpha[i], float_buffer=True)
+                pack_image.pixels.foreach_set(np.asarray(image_data, dtype=np.float32))
+                
+                base_path = f'{abs_base_filepath} {i}' if len(targets) > 1 else abs_base_filepath
+                path_exr = f'{base_path}.exr'
+                path_png = f'{base_path}.png'
+                path_webp = f'{base_path}.webp'
+                pack_image.save_render(path_exr, scene=scene)
+                # Saving through save_render would save a linear PNG, not an sRGB one which is required by VPX
+                pack_image.filepath_raw = path_png
+                pack_image.file_format = 'PNG'
+                pack_image.save()
+                bpy.data.images.remove(pack_image)
+                webp_jobs.append(webp_executor.submit(save_webp, path_png, path_webp))
+        
+        bpy.data.scenes.remove(scene)
+        for job in webp_jobs:
+            job.result()
     logger.info(f'. Nestmap rendered and saved to {base_filepath}')
 
 
-def prepare_nesting(context, obj, padding, uv_nest_name, render_sizes, tex_w, tex_h):
+def save_webp(path_png, path_webp):
+    Image.open(path_png).save(path_webp, format = "WebP", lossless = True)
+
+
+def prepare_nesting(context, obj, padding, uv_nest_name, render_sizes, offscreens, tex_w, tex_h):
     bm = bmesh.new()
     bm.from_mesh(obj.data)
     bm.faces.ensure_lookup_table()
     uv_layer = bm.loops.layers.uv[uv_nest_name]
 
     # Identify islands (faces sharing the same render id linked with respect to uv)
-    ftv, vtf = create_vert_face_db([f for f in bm.faces], uv_layer)
-    islands = get_island(bm, ftv, vtf, uv_layer)
+    faces = [f for f in bm.faces]
+    islands = get_island(faces, create_vert_face_db(obj.data, uv_nest_name))
     islands = get_merged_overlapping_islands(islands, uv_layer)
     
     if len(islands) == 0:
         return ('EMPTY', '')
 
-    # Compute island masks by rendering masks then creating a simplified span view
+    # Compute island masks by rendering masks (in pixel coordinates) then dilating them for padding. Islands are rendered to tiles
+    # of a shared offscreen (shelf packed, kept in the offscreen cache) which is read back once per batch of islands
     offscreen = None
-    vertex_shader = 'in vec2 pos; uniform vec2 ofs; void main() { gl_Position = vec4(2.0 * (pos + ofs) - vec2(1.0), 0.0, 1.0); }'
+    tiles = []
+    shelf_x = shelf_y = shelf_h = 0
+    vertex_shader = 'in vec2 pos; uniform vec2 size; void main() { gl_Position = vec4(2.0 * pos / size - vec2(1.0), 0.0, 1.0); }'
     fragment_shader = 'out vec4 FragColor; void main() { FragColor = vec4(1.0); }'
     shader_draw = gpu.types.GPUShader(vertex_shader, fragment_shader)
     gpu.state.blend_set('NONE')
-    total_pix_count = 0
-    for index, island in enumerate(islands, start=1):
-        render_path = vlm_utils.get_packmap_bakepath(context, obj.data.materials[island['faces'][0].material_index])
-        render_size = render_sizes.get(render_path)
-        if render_size is None:
-            im = bpy.data.images.load(render_path, check_existing=False)
-            render_size = (im.size[0], im.size[1])
-            render_sizes[render_path] = render_size
-            bpy.data.images.remove(im)
-        src_w, src_h = render_size
-        island_min = island['min']
-        island_max = island['max']
-        island_size = island['size']
-        island_render_id = island['mat_index']
-        island['src_w'] = src_w
-        island['src_h'] = src_h
-        island['obj'] = obj
-        island['masks'] = None
-        min_x = math.floor(island_min.x * src_w)
-        min_y = math.floor(island_min.y * src_h)
-        max_x = math.ceil(island_max.x * src_w)
-        max_y = math.ceil(island_max.y * src_h)
-        island['min_i'] = (min_x, min_y)
-        island['max_i'] = (max_x, max_y)
-        island_w = min(src_w, max(1, max_x - min_x + 2*padding))
-        island_h = min(src_h, max(1, max_y - min_y + 2*padding))
-        ofs_u = min_x / float(src_w)
-        ofs_v = min_y / float(src_h)
-        
-        # Check if the island exceed a single texture page and if so, split it
-        if island_w > tex_w or island_h > tex_h:
-            # Start with an empty selection that will be replaced by the first face
-            sel_max_uv = None
-            sel_min_uv = None
-            max_uv = Vector((-10000000.0, -10000000.0))
-            min_uv = Vector((10000000.0, 10000000.0))
-            selected_faces = []
-            unselected_faces = [f.index for f in bm.faces]
+    # Rendering must be done from the main thread, but dilating and packing the masks are independent NumPy
+    # operations (which release the GIL) and are dispatched to worker threads while the next islands are rendered
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        pending_masks = []
+        for index, island in enumerate(islands, start=1):
+            render_path = vlm_utils.get_packmap_bakepath(context, obj.data.materials[island['faces'][0].material_index])
+            render_size = render_sizes.get(render_path)
+            if render_size is None:
+                render_size = vlm_utils.get_exr_size(render_path)
+                render_sizes[render_path] = render_size
+            src_w, src_h = render_size
+            island_min = island['min']
+            island_max = island['max']
+            island_size = island['size']
+            island_render_id = island['mat_index']
+            island['src_w'] = src_w
+            island['src_h'] = src_h
+            island['obj'] = obj
+            island['masks'] = None
+            min_x = math.floor(island_min.x * src_w)
+            min_y = math.floor(island_min.y * src_h)
+            max_x = math.ceil(island_max.x * src_w)
+            max_y = math.ceil(island_max.y * src_h)
+            island['min_i'] = (min_x, min_y)
+            island['max_i'] = (max_x, max_y)
+            island_w = min(src_w, max(1, max_x - min_x + 2*padding))
+            island_h = min(src_h, max(1, max_y - min_y + 2*padding))
+            
+            # Check if the island exceed a single texture page and if so, split it
+            if island_w > tex_w or island_h > tex_h:
+                # Start with an empty selection that will be replaced by the first face
+                sel_max_uv = None
+                sel_min_uv = None
+                max_uv = Vector((-10000000.0, -10000000.0))
+                min_uv = Vector((10000000.0, 10000000.0))
+                selected_faces = []
+                unselected_faces = [f.index for f in bm.faces]
+                for face in island['faces']:
+                    # extend the uv range of the selection with this face uv
+                    for l in face.loops:
+                        uv = l[uv_layer].uv
+                        max_uv.x = max(uv.x, max_uv.x)
+                        max_uv.y = max(uv.y, max_uv.y)
+                        min_uv.x = min(uv.x, min_uv.x)
+                        min_uv.y = min(uv.y, min_uv.y)
+                    min_x = math.floor(min_uv.x * src_w)
+                    min_y = math.floor(min_uv.y * src_h)
+                    max_x = math.ceil(max_uv.x * src_w)
+                    max_y = math.ceil(max_uv.y * src_h)
+                    island_w = min(src_w, max(1, max_x - min_x + 2*padding))
+                    island_h = min(src_h, max(1, max_y - min_y + 2*padding))
+                    # if it fits (or is the first), extends the selection with this face
+                    if sel_max_uv is None or (island_w <= tex_w and island_h <= tex_h):
+                        selected_faces.append(face.index)
+                        unselected_faces.remove(face.index)
+                        sel_min_uv = min_uv.copy()
+                        sel_max_uv = max_uv.copy()
+                    max_uv = sel_max_uv.copy()
+                    min_uv = sel_min_uv.copy()
+                if selected_faces:
+                    logger.info(f'. Object {obj.name} has parts that do not fit in the target texture. It has been splitted according to the texture settings.')
+                    bm2 = bm.copy()
+                    bm2.faces.ensure_lookup_table()
+                    
+                    bmesh.ops.delete(bm, geom=[bm.faces[i] for i in selected_faces], context='FACES')
+                    bm.to_mesh(obj.data)
+                    bm.free()
+
+                    dup = obj.copy()
+                    dup.data = obj.data.copy()
+                    bmesh.ops.delete(bm2, geom=[bm2.faces[i] for i in unselected_faces], context='FACES')
+                    bm2.to_mesh(dup.data)
+                    bm2.free()
+                    [col.objects.link(dup) for col in obj.users_collection]
+                    executor.shutdown(cancel_futures=True)
+                    return ('SPLITTED', (obj, dup))
+                else:
+                    # We did not find a face that fits in the texture. No splitting is possible, just fail
+                    logger.info(f'. Object {obj} has a face that do not fit in the target texture. Nestmapping can not be achieved.')
+                    executor.shutdown(cancel_futures=True)
+                    return ('FAILED', None)
+            
+            # Render the island and create a discrete tuple model (vertical opaque spans) and a list of its column order
+            pts=[]
+            lines=[]
             for face in island['faces']:
-                # extend the uv range of the selection with this face uv
-                for l in face.loops:
-                    uv = l[uv_layer].uv
-                    max_uv.x = max(uv.x, max_uv.x)
-                    max_uv.y = max(uv.y, max_uv.y)
-                    min_uv.x = min(uv.x, min_uv.x)
-                    min_uv.y = min(uv.y, min_uv.y)
-                min_x = math.floor(min_uv.x * src_w)
-                min_y = math.floor(min_uv.y * src_h)
-                max_x = math.ceil(max_uv.x * src_w)
-                max_y = math.ceil(max_uv.y * src_h)
-                island_w = min(src_w, max(1, max_x - min_x + 2*padding))
-                island_h = min(src_h, max(1, max_y - min_y + 2*padding))
-                # if it fits (or is the first), extends the selection with this face
-                if sel_max_uv is None or (island_w <= tex_w and island_h <= tex_h):
-                    selected_faces.append(face.index)
-                    unselected_faces.remove(face.index)
-                    sel_min_uv = min_uv.copy()
-                    sel_max_uv = max_uv.copy()
-                max_uv = sel_max_uv.copy()
-                min_uv = sel_min_uv.copy()
-            if selected_faces:
-                logger.info(f'. Object {obj.name} has parts that do not fit in the target texture. It has been splitted according to the texture settings.')
-                bm2 = bm.copy()
-                bm2.faces.ensure_lookup_table()
-                
-                bmesh.ops.delete(bm, geom=[bm.faces[i] for i in selected_faces], context='FACES')
-                bm.to_mesh(obj.data)
-                bm.free()
-
-                dup = obj.copy()
-                dup.data = obj.data.copy()
-                bmesh.ops.delete(bm2, geom=[bm2.faces[i] for i in unselected_faces], context='FACES')
-                bm2.to_mesh(dup.data)
-                bm2.free()
-                [col.objects.link(dup) for col in obj.users_collection]
-                return ('SPLITTED', (obj, dup))
-            else:
-                # We did not find a face that fits in the texture. No splitting is possible, just fail
-                logger.info(f'. Object {obj} has a face that do not fit in the target texture. Nestmapping can not be achieved.')
-                return ('FAILED', None)
-        
-        # Render the island and create a discrete tuple model (vertical opaque spans) and a list of its column order
-        pts=[]
-        lines=[]
-        for face in island['faces']:
-            prev = first = None
-            for loop in face.loops:
-                uv = loop[uv_layer].uv
-                uv = ((uv[0]-ofs_u) + padding/float(src_w), (uv[1]-ofs_v) + padding/float(src_h))
-                pts.append(uv)
-                if prev:
+                prev = first = None
+                for loop in face.loops:
+                    uv = loop[uv_layer].uv
+                    uv = (uv[0] * src_w - min_x + padding, uv[1] * src_h - min_y + padding)
+                    pts.append(uv)
+                    if prev:
+                        lines.append(prev)
+                        lines.append(uv)
+                    else:
+                        first = uv
+                    prev = uv
                     lines.append(prev)
-                    lines.append(uv)
-                else:
-                    first = uv
-                prev = uv
-                lines.append(prev)
-                lines.append(first)
-        tri_batch = batch_for_shader(shader_draw, 'TRIS', {"pos": pts})
-        pt_batch = batch_for_shader(shader_draw, 'POINTS', {"pos": pts})
-        line_batch = batch_for_shader(shader_draw, 'LINES', {"pos": lines})
-
-        if offscreen is None or offscreen.width != src_w or offscreen.height != src_h:
-            if offscreen is not None: offscreen.free()
-            offscreen = gpu.types.GPUOffScreen(src_w, src_h)
+                    lines.append(first)
+            tri_batch = batch_for_shader(shader_draw, 'TRIS', {"pos": pts})
+            pt_batch = batch_for_shader(shader_draw, 'POINTS', {"pos": pts})
+            line_batch = batch_for_shader(shader_draw, 'LINES', {"pos": lines})
+
+            # Place the island in the current batch, rendering the batch first if the island does not fit (the offscreen only grows)
+            if offscreen is None or offscreen.width < island_w or offscreen.height < island_h:
+                render_island_masks(offscreen, shader_draw, tiles, padding, executor, pending_masks)
+                tiles = []
+                shelf_x = shelf_y = shelf_h = 0
+                offscreen = get_offscreen(offscreens, 'masks', max(2048, island_w), max(2048, island_h))
+            if shelf_x + island_w > offscreen.width:
+                shelf_x, shelf_y, shelf_h = 0, shelf_y + shelf_h, 0
+            if shelf_y + island_h > offscreen.height:
+                render_island_masks(offscreen, shader_draw, tiles, padding, executor, pending_masks)
+                tiles = []
+                shelf_x = shelf_y = shelf_h = 0
+            tiles.append((island, shelf_x, shelf_y, island_w, island_h, (tri_batch, pt_batch, line_batch)))
+            shelf_x = shelf_x + island_w
+            shelf_h = max(shelf_h, island_h)
+
+            island['source'] = (obj, bm)
+            island['loops'] = [loop for face in island['faces'] for loop in face.loops]
             
-        with offscreen.bind():
-            fb = gpu.state.active_framebuffer_get()
-            fb.clear(color=(0.0, 0.0, 0.0, 0.0))
-            shader_draw.bind()
-            for px in range(-padding, padding+1):
-                for py in range(-padding, padding+1):
-                    shader_draw.uniform_float("ofs", (px/float(src_w), py/float(src_h)) )
-                    tri_batch.draw(shader_draw)
-                    pt_batch.draw(shader_draw)
-                    line_batch.draw(shader_draw)
-        buffer = offscreen.texture_color.read()
-        buffer.dimensions = src_w * src_h * 4
-
-        island_pix_count = 0
-        island_hor = []
-        for x in range(island_w):
-            ymin = -1
-            spans = []
-            for y in range(island_h):
-                if buffer[4 * (x + y * src_w)] > 0:
-                    if ymin == -1: ymin = y
-                else:
-                    if ymin != -1:
-                        spans.append((ymin, y-1, y-1-ymin + 1))
-                        island_pix_count = island_pix_count + (y-1-ymin + 1)
-                        ymin = -1
-            if ymin != -1:
-                spans.append((ymin, island_h-1, island_h-1-ymin + 1))
-                island_pix_count = island_pix_count + (island_h-1-ymin + 1)
-            island_hor.append(spans)
-        total_pix_count = total_pix_count + island_pix_count
-        
-        island_ver = []
-        for y in range(island_h):
-            xmin = -1
-            spans = []
-            for x in range(island_w):
-                if buffer[4 * (x + y * src_w) + 3] > 0:
-                    if xmin == -1: xmin = x
-                else:
-                    if xmin != -1:
-                        spans.append((xmin, x-1, x-1-xmin + 1))
-                        xmin = -1
-            if xmin != -1:
-                spans.append((xmin, island_w-1, island_w-1-xmin + 1))
-            island_ver.append(spans)
-        island_mask = island_hor
-        island_masks = []
-        island_masks.append(island_hor) # 0 rotation
-        island_masks.append([span for span in reversed(island_ver)]) # 90 rotation
-        island_masks.append([span for span in reversed(island_hor)]) # 0 rotation, Flipped on X
-        island_masks.append(island_ver) # 90 rotation, Flipped on X
-
-        island['source'] = (obj, bm)
-        island['masks'] = island_masks
-        island['pixcount'] = island_pix_count
-        
-    if offscreen is not None:
-        offscreen.free()
+        render_island_masks(offscreen, shader_draw, tiles, padding, executor, pending_masks)
+
+        # Keep a single bit packed boolean mask per island, spans of each rotation will be computed when needed for nesting
+        total_pix_count = 0
+        for island, future in pending_masks:
+            island['mask_bits'], island['mask_size'], island['pixcount'] = future.result()
+            island['masks'] = [None, None, None, None]
+            total_pix_count = total_pix_count + island['pixcount']
 
     logger.info(f'. Nesting prepared ({len(islands):>3} islands, {total_pix_count:>7}px, {src_w}x{src_h} renders) for {obj.name}')
     return ('SUCCESS', NestBlock(obj, bm, islands, total_pix_count))
@@ -1028,99 +1059,281 @@ def round_for_mimpaps(x):
     #return 1<<(x-1).bit_length()
     
     
+def new_target(tex_w, tex_h, capacity=16):
+    '''Create an empty nesting page. Free vertical spans are stored per column as SoA (y0, y1) int32 arrays
+    with a fixed capacity, the number of spans used in each column being stored in n. Columns are allocated
+    up to the mipmap rounded width to allow cropping without reallocation. The total free length (sum of y1 - y0
+    of the free spans of the used columns) is tracked in free, and the width and the top row used by placed islands in used_w and used_top.
+    '''
+    w = round_for_mimpaps(tex_w)
+    target = {'y0': np.zeros((w, capacity), np.int32), 'y1': np.zeros((w, capacity), np.int32), 'n': np.ones(w, np.int32), 'width': tex_w, 'free': tex_w * (tex_h - 1), 'used_w': 0, 'used_top': -1}
+    target['y1'][:, 0] = tex_h - 1
+    return target
+
+
+def spans_of(mask):
+    '''Compute the vertical opaque spans of each column of a 2D boolean mask, as a CSR like structure of int32 arrays:
+    the spans of column c are ys0[col_ptr[c]:col_ptr[c+1]] and ys1[col_ptr[c]:col_ptr[c+1]]
+    '''
+    h, w = mask.shape
+    edges = np.diff(np.pad(mask, ((1, 1), (0, 0))).view(np.int8), axis=0).T # Transposed to get spans ordered by column
+    cols, ys0 = np.nonzero(edges == 1)
+    _, ys1 = np.nonzero(edges == -1)
+    col_ptr = np.zeros(w + 1, np.int32)
+    col_ptr[1:] = np.cumsum(np.bincount(cols, minlength=w))
+    return (col_ptr, ys0.astype(np.int32), (ys1 - 1).astype(np.int32))
+
+
+def dilate_mask(mask, padding):
+    '''Dilate a 2D boolean mask by a square of (2 * padding + 1) pixels. This gives the same result as rendering the
+    island shifted by all the integer pixel offsets in [-padding, padding] but is computed with a few separable passes.
+    '''
+    dilated = mask.copy()
+    for d in range(1, padding + 1):
+        dilated[d:, :] |= mask[:-d, :]
+        dilated[:-d, :] |= mask[d:, :]
+    mask = dilated
+    dilated = mask.copy()
+    for d in range(1, padding + 1):
+        dilated[:, d:] |= mask[:, :-d]
+        dilated[:, :-d] |= mask[:, d:]
+    return dilated
+
+
+def render_island_masks(offscreen, shader, tiles, padding, executor, pending_masks):
+    '''Render a batch of island masks, each to its tile of the offscreen (x, y, w, h), read them back at once,
+    and submit their dilation and packing to the executor
+    '''
+    if not tiles:
+        return
+    used_w = max(tile_x + tile_w for _, tile_x, _, tile_w, _, _ in tiles)
+    used_h = max(tile_y + tile_h for _, _, tile_y, _, tile_h, _ in tiles)
+    with offscreen.bind():
+        fb = gpu.state.active_framebuffer_get()
+        fb.clear(color=(0.0, 0.0, 0.0, 0.0))
+        shader.bind()
+        for _, tile_x, tile_y, tile_w, tile_h, batches in tiles:
+            # The viewport maps the island pixel coordinates to its tile and clips anything drawn outside of it
+            gpu.state.viewport_set(tile_x, tile_y, tile_w, tile_h)
+            shader.uniform_float("size", (tile_w, tile_h))
+            for batch in batches:
+                batch.draw(shader)
+        gpu.state.viewport_set(0, 0, offscreen.width, offscreen.height)
+        buffer = fb.read_color(0, 0, used_w, used_h, 1, 0, 'UBYTE') # Only the red channel is needed
+    buffer.dimensions = used_w * used_h
+    masks = np.asarray(buffer, dtype=np.uint8).reshape((used_h, used_w)) > 0
+    for island, tile_x, tile_y, tile_w, tile_h, _ in tiles:
+        pending_masks.append((island, executor.submit(finalize_island_mask, masks[tile_y:tile_y+tile_h, tile_x:tile_x+tile_w], padding)))
+
+
+def finalize_island_mask(mask, padding):
+    '''Dilate a rendered island mask for padding and bit pack it along columns (8 pixels per byte).
+    Returns (bit packed mask, mask size, pixel count)
+    '''
+    mask = dilate_mask(mask, padding)
+    return (np.packbits(mask, axis=0), mask.shape, int(np.count_nonzero(mask)))
+
+
+def get_island_mask2d(island):
+    '''Unpack the bit packed mask of an island to a 2D boolean array'''
+    return np.unpackbits(island['mask_bits'], axis=0, count=island['mask_size'][0]).view(bool)
+
+
+def get_island_mask(island, rot):
+    '''Get the column spans of an island mask for the given rotation. The 4 rotations are views of the same boolean
+    mask, their spans are only computed on first use.
+    '''
+    masks = island['masks']
+    if masks[rot] is None:
+        mask = get_island_mask2d(island)
+        if rot == 0: # Original position
+            view = mask
+        elif rot == 1: # 90 rotation
+            view = mask[::-1, :].T
+        elif rot == 2: # Flipped on X
+            view = mask[:, ::-1]
+        else: # 90 rotation, Flipped on X
+            view = mask.T
+        masks[rot] = spans_of(view)
+    return masks[rot]
+
+
+@njit(cache=True)
+def probe_island(col_ptr, ys0, ys1, target_y0, target_y1, target_n, x):
+    '''Find the lowest y where an island mask can be placed at column x of a target page. Returns y or -1 if it does not fit'''
+    w = len(col_ptr) - 1
+    y = 0
+    n_succeeded = 0
+    col = 0
+    while n_succeeded < w:
+        y_start = y
+        # Find matching y, if any, that allows to place all island's column spans
+        for s in range(col_ptr[col], col_ptr[col + 1]):
+            # First target span that is above current y and large enough to host the island span. Free spans are sorted
+            # so, when compiled, the ones ending below the island span are skipped with a binary search (in plain Python,
+            # the NumPy call costs more than the linear skip on short span lists)
+            c = x + col
+            n = target_n[c]
+            place = -1
+            start = np.searchsorted(target_y1[c, :n], y + ys1[s]) if has_numba else 0
+            for i in range(start, n):
+                if y + ys1[s] <= target_y1[c, i] and ys1[s] - ys0[s] <= target_y1[c, i] - target_y0[c, i]:
+                    place = i
+                    break
+            if place == -1:
+                return -1
+            if target_y0[c, place] > y + ys0[s]:
+                y = target_y0[c, place] - ys0[s]
+        if y == y_start: # Placed at selected location
+            n_succeeded = n_succeeded + 1
+        elif col_ptr[col + 1] - col_ptr[col] == 1: # Moved up to a position where the single span of this column fits
+            n_succeeded = 1
+        else: # Failed to place at selected location, but found a position upper to test
+            n_succeeded = 0
+        col = col + 1
+        if col == w: col = 0
+    return y
+
+
+@njit(cache=True, parallel=True)
+def place_island(col_ptr, ys0, ys1, target_y0, target_y1, target_n, tex_w, block):
+    '''Find the bottom left placement of an island mask inside a target page. Returns (x, y) or (-1, -1) if it does not fit.
+    Each column is probed independently, so blocks of columns are probed in parallel and the leftmost fitting one is kept.
+    '''
+    w = len(col_ptr) - 1
+    n_x = max(1, tex_w - w)
+    ys = np.empty(block, np.int32)
+    for x0 in range(0, n_x, block):
+        n = min(block, n_x - x0)
+        for i in prange(n):
+            ys[i] = probe_island(col_ptr, ys0, ys1, target_y0, target_y1, target_n, x0 + i)
+        for i in range(n):
+            if ys[i] >= 0:
+                return x0 + i, ys[i]
+    return -1, -1
+
+
+@njit(cache=True)
+def commit_island(col_ptr, ys0, ys1, target_y0, target_y1, target_n, x, y):
+    '''Update target page free spans after placing an island mask at (x, y). Target capacity must allow one more span per island span.
+    The free spans of each column are rebuilt in a single pass since the island spans of a column are sorted like the free spans.
+    '''
+    buf_y0 = np.empty(target_y0.shape[1], np.int32)
+    buf_y1 = np.empty(target_y1.shape[1], np.int32)
+    for col in range(len(col_ptr) - 1):
+        if col_ptr[col] == col_ptr[col + 1]:
+            continue
+        c = x + col
+        n = target_n[c]
+        i = m = 0
+        for s in range(col_ptr[col], col_ptr[col + 1]):
+            span_y0 = y + ys0[s]
+            span_y1 = y + ys1[s]
+            # Keep the free spans below the island span, the next one is the free span hosting it
+            while i < n and target_y1[c, i] < span_y1:
+                buf_y0[m] = target_y0[c, i]
+                buf_y1[m] = target_y1[c, i]
+                m = m + 1
+                i = i + 1
+            if i == n:
+                break
+            # Replace the free span by the remaining parts below and above the island span. The part above is kept
+            # as the current free span since it may host the next island span
+            check_y0 = target_y0[c, i]
+            check_y1 = target_y1[c, i]
+            if check_y0 < span_y0:
+                buf_y0[m] = check_y0
+                buf_y1[m] = span_y0
+                m = m + 1
+            if span_y1 < check_y1:
+                target_y0[c, i] = span_y1
+            else:
+                i = i + 1
+        for j in range(i, n):
+            buf_y0[m] = target_y0[c, j]
+            buf_y1[m] = target_y1[c, j]
+            m = m + 1
+        target_y0[c, :m] = buf_y0[:m]
+        target_y1[c, :m] = buf_y1[:m]
+        target_n[c] = m
+
+
 def perform_nesting(islands, uv_nest_name, tex_w, tex_h, padding, only_one_page=False):
     # Placement algorithm (simple discret bottom left direct placement)
     targets = []
+    # Number of columns probed in parallel for each placement. Without Numba, columns are probed one at a time to stop at the first fit
+    probe_block = 4 * get_num_threads() if has_numba else 1
     #islands = sorted(islands, key=lambda p:p['bb_area'], reverse=True)
-    islands = sorted(islands, key=lambda p:p['pixcount'], reverse=True)
+    order = np.argsort(-np.fromiter((p['pixcount'] for p in islands), np.int64, len(islands)), kind='stable')
+    islands = [islands[i] for i in order]
+    if only_one_page and sum(island['pixcount'] for island in islands if island['masks']) > tex_w * tex_h:
+        # Fast fail if the islands can't fit on a single page whatever the placement. Island spans may share their end pixels
+        # with other island spans, so an island needs at least its pixel count minus its span count (for its best orientation)
+        min_area = 0
+        for island in islands:
+            if island['masks']:
+                min_area += island['pixcount'] - max(len(get_island_mask(island, 0)[1]), len(get_island_mask(island, 1)[1]))
+        if min_area > tex_w * tex_h:
+            logger.info(f'. Islands can not fit on a single page (at least {min_area}px for {tex_w * tex_h}px available)')
+            return NestMap(padding, islands, [], [])
     for index, island in enumerate(islands, start=1):
         island_masks = island['masks']
         if not island_masks: continue
-        island_w = len(island_masks[0]) # width is number of column
-        island_h = len(island_masks[1]) # height is number of column of 90 rotated island
+        island_h, island_w = island['mask_size']
         if island_w > tex_w or island_h > tex_h:
             # FIXME this needs to be handled gracefully (here it skips, but it will likely crash afterward)
             logger.info(f'. Island #{index:>3}/{len(islands)} size is {island_w}x{island_h} and cannot be placed in a {tex_w}x{tex_h} texture, skipping island')
             continue
-        x = y = n = 0
-        n_succeeded = 0
-        col_index = 0
-        rot_index = 0
+        n = 0
         rot_order = [0, 2, 1, 3] if island_w <= island_h else [1, 3, 0, 2]
         while True:
-            col = col_index
-            rot = rot_order[rot_index]
-            x_start = x
-            y_start = y
-            mask = island_masks[rot]
-            w = len(mask)
             if n >= len(targets):
-                targets.append([[(0, tex_h-1, tex_h)] for i in range(tex_w)])
+                targets.append(new_target(tex_w, tex_h))
             target = targets[n]
-            col_index = (col_index + 1) % w
-            # Find matching y, if any, that allows to place all island's column spans
-            for span in mask[col]:
-                # First target span that is above current y and large enough to host the island span
-                place = next((place for place in target[x + col] if span[2] <= place[2] and y+span[1] <= place[1]), None)
-                if not place:
-                    x = x + 1
+            for rot in rot_order:
+                # Each island span consumes its length (y1 - y0) of free span length, skip the page scan if there is not enough left
+                if island['pixcount'] - len(get_island_mask(island, rot)[1]) > target['free']:
+                    x = -1
+                    continue
+                x, y = place_island(*get_island_mask(island, rot), target['y0'], target['y1'], target['n'], tex_w, probe_block)
+                if x >= 0:
                     break
-                if place[0] > y + span[0]:
-                    y = place[0] - span[0]
-            if x == x_start:
-                if y == y_start: # Placed at selected location
-                    n_succeeded = n_succeeded + 1
-                    if n_succeeded >= w:
-                        break
-                else: # Failed to place at selected location, but found a position upper to test
-                    n_succeeded = 0
-            else: # Failed to place using the selected row, moving right
-                n_succeeded = 0
-                y = 0
-                if x + w >= tex_w: # Fully failed, test with next rotation, or, if all rotations tested, go to next page (if not running in single page mode)
-                    x = 0
-                    col_index = 0
-                    rot_index = rot_index + 1
-                    if rot_index >= len(island_masks):
-                        rot_index = 0
-                        n = n + 1
-                        if only_one_page: # Fast Fail if packing to a single page
-                            island['place'] = (n, x, y, rot) # mark it to identify the first offender
-                            logger.info(f'. Island #{index:>3}/{len(islands)} could not be placed (single page mode) pixcount:{island["pixcount"]:>7}px  from {island["source"][0].name}')
-                            return NestMap(padding, islands, [], [])
+            if x >= 0:
+                break
+            # Fully failed with all rotations, go to next page (if not running in single page mode)
+            n = n + 1
+            if only_one_page: # Fast Fail if packing to a single page
+                island['place'] = (n, 0, 0, rot) # mark it to identify the first offender
+                logger.info(f'. Island #{index:>3}/{len(islands)} could not be placed (single page mode) pixcount:{island["pixcount"]:>7}px  from {island["source"][0].name}')
+                return NestMap(padding, islands, [], [])
         island['place'] = (n, x, y, rot)
         # logger.info(f'. Island #{index:>3}/{len(islands)} placed on nestmap #{n} at {x:>4}, {y:>4} o:{rot} pixcount:{island["pixcount"]:>7}px  from {island["source"][0].name}')
         
-        # Update target mask
-        target_mask = targets[n]
-        for col, spans in enumerate(island_masks[rot]):
-            for span in spans:
-                for i, check in enumerate(target_mask[x + col]):
-                    if span[2] <= check[2] and y+span[1] <= check[1]:
-                        target_mask[x + col].pop(i)
-                        if y+span[1] < check[1]:
-                            target_mask[x + col].insert(i, (y+span[1], check[1], check[1] - (y+span[1]) + 1))
-                        if check[0] < y+span[0]:
-                            target_mask[x + col].insert(i, (check[0], y+span[0], y+span[0] - check[0] + 1))
-                        break
+        # Update target mask, growing span capacity if needed (each island span splits at most one free span in two)
+        col_ptr, ys0, ys1 = get_island_mask(island, rot)
+        w = len(col_ptr) - 1
+        capacity = target['y0'].shape[1]
+        required = int(np.max(target['n'][x:x+w] + np.diff(col_ptr)))
+        if required > capacity:
+            while capacity < required: capacity = 2 * capacity
+            for k in ('y0', 'y1'):
+                grown = np.zeros((target[k].shape[0], capacity), np.int32)
+                grown[:, :target[k].shape[1]] = target[k]
+                target[k] = grown
+        commit_island(col_ptr, ys0, ys1, target['y0'], target['y1'], target['n'], x, y)
+        target['free'] -= island['pixcount'] - len(ys0)
+        used_cols = np.flatnonzero(np.diff(col_ptr))
+        if len(used_cols) > 0:
+            target['used_w'] = max(target['used_w'], x + int(used_cols[-1]) + 1)
+            target['used_top'] = max(target['used_top'], y + int(np.max(ys1)))
 
     # Crop targets to smallest power of two (if not DX9 will lower the texture quality...)
     target_heights = []
     for target in targets:
         # Remove empty columns on the right
-        while len(target)>0 and len(target[-1]) == 1 and target[-1][0][2] == tex_h:
-            target.pop()
-        target_w = round_for_mimpaps(len(target))
-        while len(target) < target_w:
-            target.append([(0, tex_h-1, tex_h)])
-        # Evaluate upper bound
-        ymax = 0
-        for spans in target:
-            if len(spans) > 0:
-                ymax = max(ymax, spans[-1][0] - 1)
-            else:
-                ymax = tex_h
-                break
+        target['width'] = round_for_mimpaps(target['used_w'])
+        # Evaluate upper bound (bottom of the free span above the highest island span, or full height if it reaches the top)
+        ymax = tex_h if target['used_top'] >= tex_h - 1 else max(0, target['used_top'] - 1)
         target_h = round_for_mimpaps(ymax)
         target_heights.append(target_h)
         
@@ -1133,26 +1346,24 @@ def perform_nesting(islands, uv_nest_name, tex_w, tex_h, padding, only_one_page=
         max_x, max_y = island['max_i']
         src_w = island['src_w']
         src_h = island['src_h']
-        target_w = len(targets[n])
+        target_w = targets[n]['width']
         target_h = target_heights[n]
-        for face in island['faces']:
-            for loop in face.loops:
-                uv = loop[uv_layer].uv
-                u0 = uv[0] * src_w - min_x
-                v0 = uv[1] * src_h - min_y
-                if rot == 0: # Original position
-                    u = u0
-                    v = v0
-                elif rot == 1: # 90 rotation
-                    u = (max_y - min_y) - v0
-                    v = u0
-                elif rot == 2: # Flipped on X
-                    u = (max_x - min_x) - u0
-                    v = v0
-                elif rot == 3: # 90 rotation, Flipped on x
-                    u = v0
-                    v = u0
-                loop[uv_layer].uv = ((x + padding + u)/float(target_w) + (n * 2), (y + padding + v)/float(target_h))
+        # Affine transform from source uv to nestmap uv: scale to source pixels, move to the island mask origin,
+        # rotate/flip inside the island mask, move to the placement, then scale to nestmap uv (page n is at u = 2n)
+        if rot == 0: # Original position
+            r, t = ((1, 0), (0, 1)), (0, 0)
+        elif rot == 1: # 90 rotation
+            r, t = ((0, -1), (1, 0)), (max_y - min_y, 0)
+        elif rot == 2: # Flipped on X
+            r, t = ((-1, 0), (0, 1)), (max_x - min_x, 0)
+        elif rot == 3: # 90 rotation, Flipped on x
+            r, t = ((0, 1), (1, 0)), (0, 0)
+        r = np.array(r, np.float64)
+        scale = np.array((1.0 / target_w, 1.0 / target_h))
+        m = scale[:, None] * r * np.array((src_w, src_h))[None, :]
+        ofs = scale * (np.array((x + padding, y + padding)) + t - r @ (min_x, min_y)) + (n * 2, 0)
+        uvs = get_island_uvs(island, uv_layer).astype(np.float64) @ m.T + ofs
+        set_island_uvs(island, uv_layer, uvs)
     
     return NestMap(padding, islands, targets, target_heights)
 
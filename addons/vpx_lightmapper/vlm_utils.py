@@ -17,6 +17,7 @@ import bpy
 import array
 import os
 import re
+import struct
 import pathlib
 import gpu
 import math
@@ -355,6 +356,43 @@ def get_image_or_black(path, black_is_none=False):
         return ('black', black_image)
 
 
+def read_exr_string(f):
+    '''Read a null terminated string from an OpenEXR header, raising EOFError if the file ends before its terminator'''
+    chars = []
+    while True:
+        c = f.read(1)
+        if not c:
+            raise EOFError('Unexpected end of OpenEXR header')
+        if c == b'\0':
+            return b''.join(chars)
+        chars.append(c)
+
+
+def get_exr_size(path):
+    '''Get the size of an OpenEXR image by parsing its header (data window), without decoding its pixels.
+    Falls back to loading the image through Blender if the header can't be parsed.
+    '''
+    try:
+        with open(bpy.path.abspath(path), 'rb') as f:
+            magic, version = struct.unpack('<ii', f.read(8))
+            if magic == 20000630:
+                while True:
+                    name = read_exr_string(f)
+                    if not name: break
+                    attr_type = read_exr_string(f)
+                    attr_size = struct.unpack('<i', f.read(4))[0]
+                    if name == b'dataWindow' and attr_type == b'box2i':
+                        x_min, y_min, x_max, y_max = struct.unpack('<iiii', f.read(16))
+                        return (x_max - x_min + 1, y_max - y_min + 1)
+                    f.seek(attr_size, os.SEEK_CUR)
+    except (OSError, EOFError, struct.error):
+        pass
+    im = bpy.data.images.load(path, check_existing=False)
+    size = (im.size[0], im.size[1])
+    bpy.data.images.remove(im)
+    return size
+
+
 def mkpath(path):
     pathlib.Path(bpy.path.abspath(path)).mkdir(parents=True, exist_ok=True)
 